@@ -9,9 +9,12 @@ import json
 import sys
 import re
 
+# Month number prefix of a header such as "1 kum"
+_LEADING_DIGITS = re.compile(r'(\d+)')
+
 def analyze_csv(input_path, output_path):
     """Analyze CSV structure and create TransformSpec"""
-    with open(input_path, 'r', encoding='utf-8') as f:
+    with open(input_path, 'r', encoding='utf-8', newline='') as f:
         reader = csv.reader(f, delimiter=';')
         
         # Read first two rows (headers)
@@ -28,7 +31,7 @@ def analyze_csv(input_path, output_path):
             year_str = headers_row2[i].strip()
             
             # Extract month from column name (e.g., "1 kum" → 1)
-            month_match = re.match(r'(\d+)', col_name)
+            month_match = _LEADING_DIGITS.match(col_name)
             month = int(month_match.group(1)) if month_match else i
             
             # Parse year
@@ -54,7 +57,7 @@ def analyze_csv(input_path, output_path):
     
     # Write TransformSpec JSON
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(spec, f, indent=2)
+        json.dump(spec, f, separators=(',', ':'))
     
     print(f"TransformSpec written to {output_path}")
 
@@ -2,10 +2,11 @@
 """
 HTTP Server for CSV Data Analysis File Operations
 
-Exposes three HTTP endpoints for file-based operations:
+Exposes four HTTP endpoints for file-based operations:
 1. POST /analyze-csv - Detect CSV structure and output TransformSpec
 2. POST /transform-csv - Convert wide format to normalized format  
 3. POST /load-sqlite - Import normalized data into SQLite
+4. POST /transform-and-load - Convert and import in one pass, skipping the normalized CSV
 """
 
 import json
@@ -14,8 +15,10 @@ import csv
 import sqlite3
 import re
 import os
-import io
-from typing import Optional
+import shutil
+from functools import lru_cache
+from itertools import chain
+from typing import Iterable, Iterator, Optional, Tuple
 from pathlib import Path
 from flask import Flask, request, jsonify
 
@@ -24,18 +27,230 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("csv-http-server")
 
 app = Flask(__name__)
+# Responses are consumed by clients, not read by people: skip key sorting and pretty-printing
+app.json.sort_keys = False
+app.json.compact = True
+
+# Patterns used on every request, compiled once at import
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9_]')
+_MULTI_UNDERSCORE = re.compile(r'_+')
+_LEADING_DIGITS = re.compile(r'(\d+)')
+
+# Seconds a load waits for another load into the same database to finish
+LOAD_LOCK_TIMEOUT = float(os.getenv("LOAD_LOCK_TIMEOUT", "600"))
+
+@lru_cache(maxsize=1024)
+def _to_snake(name: str) -> str:
+    """Convert a dataset name to snake_case (cached, callers repeat the same names)"""
+    name = _NON_ALNUM.sub('_', name.lower())
+    return _MULTI_UNDERSCORE.sub('_', name).strip('_')
 
 def parse_european_number(value_str: str) -> Optional[float]:
     """Convert European number format (1.126.286) to float"""
-    if not value_str or value_str.strip() == '':
+    if not value_str:
         return None
     
-    cleaned = value_str.strip().replace('.', '')
+    # float() ignores surrounding whitespace and rejects blank strings itself
     try:
-        return float(cleaned)
+        return float(value_str.replace('.', ''))
     except ValueError:
         return None
 
+def link_or_copy(src: str, dst: str) -> None:
+    """Hardlink src to dst, falling back to a kernel-side copy across filesystems"""
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        # Replace rather than truncate, dst may be a link to a previously imported file
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def split_until_quoted(f, delimiter: str) -> Iterator[list]:
+    """Split lines directly until the first quote, then hand the rest to csv.reader"""
+    for line in f:
+        if '"' in line:
+            yield from csv.reader(chain([line], f), delimiter=delimiter)
+            return
+        yield line.rstrip('\r\n').split(delimiter)
+
+def row_reader(f, spec: dict) -> Iterator[list]:
+    """Return a row iterator for a CSV file; unquoted lines are split directly"""
+    delimiter = spec['delimiter']
+    quoting = spec.get('quoting')
+    if quoting == 'none':
+        # Without quoted fields a plain split gives the same rows as csv.reader, faster
+        return (line.rstrip('\r\n').split(delimiter) for line in f)
+    if quoting is None:
+        return split_until_quoted(f, delimiter)
+    return csv.reader(f, delimiter=delimiter)
+
+def iter_normalized(spec: dict, csv_path: str) -> Iterator[Tuple]:
+    """Yield normalized (factory, year, month, ytd_value) records from a wide CSV"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = row_reader(f, spec)
+        
+        # Skip header rows
+        next(reader)
+        next(reader)
+        
+        # Bind column specs once instead of looking them up per cell
+        factory_idx = spec['factory_column_index']
+        cols = [(c['column_index'], c['year'], c['month']) for c in spec['data_columns']]
+        parse = parse_european_number
+        
+        # Process data rows
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+                
+            factory = row[factory_idx]
+            
+            row_len = len(row)
+            for col_idx, year, month in cols:
+                if col_idx < row_len:
+                    # Sparse sheets leave many cells empty, emit those as NULL without parsing
+                    raw_value = row[col_idx]
+                    ytd_value = parse(raw_value) if raw_value else None
+                    yield (factory, year, month, ytd_value)
+
+def load_into_sqlite(db_path: str, rows: Iterable[Tuple]) -> Tuple[int, int]:
+    """
+    Load normalized records into a dataset database and set up the derived views.
+    
+    Returns:
+        Number of records and number of distinct factories loaded
+    """
+    # Transactions are explicit, so skip the implicit BEGINs and keep prepared
+    # statements cached for the lifetime of the connection
+    conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=256,
+                           timeout=LOAD_LOCK_TIMEOUT)
+    try:
+        # Bulk-load tuning: the database is rebuilt from the normalized data,
+        # so durability can be traded for fewer fsyncs and a larger page cache
+        # page_size only applies to a new database and must be set before WAL is enabled
+        for pragma in ('page_size=8192', 'journal_mode=WAL', 'synchronous=OFF', 'temp_store=MEMORY',
+                       'cache_size=-262144', 'mmap_size=268435456'):
+            conn.execute(f'PRAGMA {pragma}')
+        cursor = conn.cursor()
+        
+        # Take the write lock up front so concurrent loads into the same database
+        # wait their turn (up to LOAD_LOCK_TIMEOUT) instead of failing on a lock
+        # upgrade; the schema changes and the rows below are committed together
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        # Factory names are stored once in factories and referenced by integer id;
+        # the factory_data view keeps the (factory, year, month, ytd_value) shape
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS factories (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS factory_values (
+                factory_id INTEGER NOT NULL REFERENCES factories(id),
+                year INTEGER,
+                month INTEGER,
+                ytd_value REAL,
+                PRIMARY KEY (factory_id, year, month)
+            )
+        ''')
+        
+        # Databases created before factory names were dictionary-encoded still
+        # have a factory_data table; its rows are carried over below. Older
+        # databases also hold monthly_values as a table, which becomes a view
+        cursor.execute("SELECT name, type FROM sqlite_master WHERE name IN ('factory_data', 'monthly_values')")
+        object_types = dict(cursor.fetchall())
+        has_legacy_table = object_types.get('factory_data') == 'table'
+        
+        # Drop secondary indexes so the bulk insert doesn't maintain them row by row
+        cursor.execute('DROP INDEX IF EXISTS idx_year_month')
+        
+        # Stage rows, then resolve factory names to ids in one join
+        cursor.execute('''
+            CREATE TEMP TABLE staging (
+                factory TEXT NOT NULL,
+                year INTEGER,
+                month INTEGER,
+                ytd_value REAL
+            )
+        ''')
+        if has_legacy_table:
+            cursor.execute('INSERT INTO staging SELECT factory, year, month, ytd_value FROM factory_data')
+            cursor.execute('DROP TABLE factory_data')
+        if object_types.get('monthly_values') == 'table':
+            cursor.execute('DROP TABLE monthly_values')
+        
+        cursor.executemany('''
+            INSERT INTO staging (factory, year, month, ytd_value)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+        cursor.execute('INSERT OR IGNORE INTO factories (name) SELECT DISTINCT factory FROM staging')
+        cursor.execute('''
+            INSERT OR REPLACE INTO factory_values (factory_id, year, month, ytd_value)
+            SELECT f.id, s.year, s.month, s.ytd_value
+            FROM staging s
+            JOIN factories f ON f.name = s.factory
+            ORDER BY s.rowid
+        ''')
+        cursor.execute('DROP TABLE temp.staging')
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS factory_data AS
+            SELECT f.name AS factory, v.year, v.month, v.ytd_value
+            FROM factory_values v
+            JOIN factories f ON f.id = v.factory_id
+        ''')
+        
+        # Create indexes
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_year_month ON factory_values(year, month)')
+        
+        # Monthly values are derived on read: the difference to the previous month's
+        # YTD value, taken with LAG over each factory/year. Partitioning by the exposed
+        # factory name lets a WHERE factory = ... filter reach the window as an index
+        # lookup; the view is recreated so older databases pick up this definition
+        cursor.execute('DROP VIEW IF EXISTS monthly_values')
+        cursor.execute('''
+            CREATE VIEW monthly_values AS
+            SELECT 
+                f.name AS factory,
+                v.year,
+                v.month,
+                v.ytd_value,
+                CASE 
+                    WHEN v.month = 1 THEN v.ytd_value
+                    WHEN LAG(v.month) OVER w = v.month - 1
+                        THEN v.ytd_value - COALESCE(LAG(v.ytd_value) OVER w, 0)
+                    ELSE v.ytd_value
+                END as month_value
+            FROM factory_values v
+            JOIN factories f ON f.id = v.factory_id
+            WINDOW w AS (PARTITION BY f.name, v.year ORDER BY v.month)
+        ''')
+        
+        conn.commit()
+        
+        # Get summary
+        cursor.execute('SELECT COUNT(*) FROM factory_values')
+        count = cursor.fetchone()[0]
+        
+        cursor.execute('SELECT COUNT(DISTINCT factory_id) FROM factory_values')  
+        factories = cursor.fetchone()[0]
+        
+        # Back to normal durability and checkpoint, so the bulk load is synced to disk
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA wal_checkpoint')
+    except BaseException:
+        # Release the write lock now rather than whenever the connection is collected
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return count, factories
+
 @app.route('/analyze-csv', methods=['POST'])
 def analyze_csv():
     """
@@ -64,35 +279,35 @@ def analyze_csv():
             return jsonify({"error": "csv_input and dataset_name are required"}), 400
         
         # Convert dataset name to snake_case
-        dataset_name = re.sub(r'[^a-zA-Z0-9_]', '_', dataset_name.lower())
-        dataset_name = re.sub(r'_+', '_', dataset_name).strip('_')
+        dataset_name = _to_snake(dataset_name)
         
         # Create data directory if it doesn't exist
         os.makedirs('data', exist_ok=True)
         
         # Handle input based on type
+        csv_file_path = f'data/{dataset_name}_raw.csv'
         if is_content:
-            # Parse CSV content directly and save to file for consistency
-            csv_file_path = f'data/{dataset_name}_raw.csv'
+            # Replace rather than truncate, the path may be a link to a previously imported file
+            try:
+                os.unlink(csv_file_path)
+            except FileNotFoundError:
+                pass
+            # Save to file for consistency, encoding in 1 MB slices
             with open(csv_file_path, 'w', encoding='utf-8') as f:
-                f.write(csv_input)
-            csv_data = io.StringIO(csv_input)
-            reader = csv.reader(csv_data, delimiter=';')
+                for start in range(0, len(csv_input), 1 << 20):
+                    f.write(csv_input[start:start + (1 << 20)])
         else:
             # Read from file path
             if not os.path.exists(csv_input):
                 return jsonify({"error": f"CSV file not found: {csv_input}"}), 404
-            # Copy to data directory with dataset naming
-            csv_file_path = f'data/{dataset_name}_raw.csv'
-            import shutil
-            shutil.copy2(csv_input, csv_file_path)
-            with open(csv_input, 'r', encoding='utf-8') as f:
-                csv_content = f.read()
-            csv_data = io.StringIO(csv_content)
-            reader = csv.reader(csv_data, delimiter=';')
-        
-        headers_row1 = next(reader)  # '1 kum', '2 kum', etc.
-        headers_row2 = next(reader)  # years: 2025, 2024, etc.
+            # Link into data directory with dataset naming
+            link_or_copy(csv_input, csv_file_path)
+        
+        # Only the two header rows are parsed, straight off the saved file
+        with open(csv_file_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter=';')
+            headers_row1 = next(reader)  # '1 kum', '2 kum', etc.
+            headers_row2 = next(reader)  # years: 2025, 2024, etc.
         
         factory_column = headers_row1[0]
         
@@ -101,7 +316,7 @@ def analyze_csv():
             col_name = headers_row1[i]
             year_str = headers_row2[i].strip()
             
-            month_match = re.match(r'(\d+)', col_name)
+            month_match = _LEADING_DIGITS.match(col_name)
             month = int(month_match.group(1)) if month_match else i
             
             try:
@@ -124,11 +339,15 @@ def analyze_csv():
             "data_columns": columns,
             "delimiter": ";"
         }
+        if is_content:
+            # Pasted content is already in memory, so quoting is known for free;
+            # for files the transform detects it while reading
+            spec["quoting"] = "minimal" if '"' in csv_input else "none"
         
         # Save spec to file
         spec_path = f'data/{dataset_name}_spec.json'
         with open(spec_path, 'w', encoding='utf-8') as f:
-            json.dump(spec, f, indent=2)
+            json.dump(spec, f, separators=(',', ':'))
         
         return jsonify({
             "status": "success",
@@ -167,8 +386,7 @@ def transform_csv():
             return jsonify({"error": "dataset_name is required"}), 400
         
         # Convert dataset name to snake_case
-        dataset_name = re.sub(r'[^a-zA-Z0-9_]', '_', dataset_name.lower())
-        dataset_name = re.sub(r'_+', '_', dataset_name).strip('_')
+        dataset_name = _to_snake(dataset_name)
         
         # Check if dataset files exist
         spec_path = f'data/{dataset_name}_spec.json'
@@ -183,49 +401,22 @@ def transform_csv():
         if not os.path.exists(csv_path):
             return jsonify({"error": f"CSV file not found: {csv_path}"}), 404
         
-        # Process CSV
-        normalized_data = []
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f, delimiter=spec['delimiter'])
-            
-            # Skip header rows
-            next(reader)
-            next(reader)
-            
-            # Process data rows
-            for row in reader:
-                if not row or not row[0].strip():
-                    continue
-                    
-                factory = row[spec['factory_column_index']]
-                
-                for col_spec in spec['data_columns']:
-                    col_idx = col_spec['column_index']
-                    if col_idx < len(row):
-                        raw_value = row[col_idx]
-                        ytd_value = parse_european_number(raw_value)
-                        
-                        normalized_data.append({
-                            'factory': factory,
-                            'year': col_spec['year'],
-                            'month': col_spec['month'], 
-                            'ytd_value': ytd_value
-                        })
-        
-        # Write normalized CSV
+        # Stream normalized rows straight to the output file
         normalized_path = f'data/{dataset_name}_normalized.csv'
+        records_processed = 0
         with open(normalized_path, 'w', encoding='utf-8', newline='') as f:
-            fieldnames = ['factory', 'year', 'month', 'ytd_value']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(normalized_data)
+            writer = csv.writer(f)
+            writer.writerow(['factory', 'year', 'month', 'ytd_value'])
+            for record in iter_normalized(spec, csv_path):
+                writer.writerow(record)
+                records_processed += 1
         
         return jsonify({
             "status": "success",
             "message": f"Dataset '{dataset_name}' transformation complete",
             "dataset_name": dataset_name,
             "normalized_path": normalized_path,
-            "records_processed": len(normalized_data)
+            "records_processed": records_processed
         })
         
     except Exception as e:
@@ -255,8 +446,7 @@ def load_sqlite():
             return jsonify({"error": "dataset_name is required"}), 400
         
         # Convert dataset name to snake_case
-        dataset_name = re.sub(r'[^a-zA-Z0-9_]', '_', dataset_name.lower())
-        dataset_name = re.sub(r'_+', '_', dataset_name).strip('_')
+        dataset_name = _to_snake(dataset_name)
         
         # Check if normalized CSV exists
         normalized_path = f'data/{dataset_name}_normalized.csv'
@@ -264,80 +454,84 @@ def load_sqlite():
             return jsonify({"error": f"Normalized dataset '{dataset_name}' not found. Run transform-csv first."}), 404
         
         db_path = f'data/{dataset_name}.db'
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        with open(normalized_path, 'r', encoding='utf-8', newline='') as f:
+            # Positional rows skip building a dict per row; columns are located from the header
+            reader = csv.reader(f)
+            header = next(reader)
+            fi, yi, mi, vi = (header.index(name) for name in ('factory', 'year', 'month', 'ytd_value'))
+            rows = ((row[fi], int(row[yi]), int(row[mi]), float(row[vi]) if row[vi] else None)
+                    for row in reader if row)
+            count, factories = load_into_sqlite(db_path, rows)
         
-        # Create table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS factory_data (
-                factory TEXT NOT NULL,
-                year INTEGER,
-                month INTEGER,
-                ytd_value REAL,
-                PRIMARY KEY (factory, year, month)
-            )
-        ''')
+        return jsonify({
+            "status": "success",
+            "message": f"Dataset '{dataset_name}' loaded successfully into database",
+            "dataset_name": dataset_name,
+            "database_path": db_path,
+            "records_loaded": count,
+            "factories_count": factories,
+            "tables_created": ["factories", "factory_values", "factory_data", "monthly_values"]
+        })
         
-        # Create indexes
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_factory ON factory_data(factory)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_year_month ON factory_data(year, month)')
+    except Exception as e:
+        logger.error(f"Error loading dataset: {str(e)}")
+        return jsonify({"error": f"Error loading dataset: {str(e)}"}), 500
+
+@app.route('/transform-and-load', methods=['POST'])
+def transform_and_load():
+    """
+    Transform a dataset and load it into SQLite in one pass, without writing
+    the intermediate normalized CSV.
+    
+    Request Body:
+        {
+            "dataset_name": "Name of the dataset to transform and load"
+        }
+    
+    Returns:
+        JSON response with load results
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request must contain JSON data"}), 400
         
-        # Load data from normalized CSV
-        with open(normalized_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            
-            for row in reader:
-                ytd_value = float(row['ytd_value']) if row['ytd_value'] else None
-                cursor.execute('''
-                    INSERT OR REPLACE INTO factory_data (factory, year, month, ytd_value)
-                    VALUES (?, ?, ?, ?)
-                ''', (row['factory'], int(row['year']), int(row['month']), ytd_value))
-        
-        # Create derived table
-        cursor.execute('DROP TABLE IF EXISTS monthly_values')
-        cursor.execute('''
-            CREATE TABLE monthly_values AS
-            SELECT 
-                f1.factory,
-                f1.year,
-                f1.month,
-                f1.ytd_value,
-                CASE 
-                    WHEN f1.month = 1 THEN f1.ytd_value
-                    ELSE f1.ytd_value - COALESCE(f2.ytd_value, 0)
-                END as month_value
-            FROM factory_data f1
-            LEFT JOIN factory_data f2 ON 
-                f1.factory = f2.factory AND 
-                f1.year = f2.year AND 
-                f1.month = f2.month + 1
-            ORDER BY f1.factory, f1.year, f1.month
-        ''')
+        dataset_name = data.get('dataset_name')
+        if not dataset_name:
+            return jsonify({"error": "dataset_name is required"}), 400
         
-        conn.commit()
+        # Convert dataset name to snake_case
+        dataset_name = _to_snake(dataset_name)
         
-        # Get summary
-        cursor.execute('SELECT COUNT(*) FROM factory_data')
-        count = cursor.fetchone()[0]
+        # Check if dataset files exist
+        spec_path = f'data/{dataset_name}_spec.json'
+        if not os.path.exists(spec_path):
+            return jsonify({"error": f"Dataset '{dataset_name}' not found. Run analyze-csv first."}), 404
         
-        cursor.execute('SELECT COUNT(DISTINCT factory) FROM factory_data')  
-        factories = cursor.fetchone()[0]
+        # Load TransformSpec
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
         
-        conn.close()
+        csv_path = spec['csv_file_path']
+        if not os.path.exists(csv_path):
+            return jsonify({"error": f"CSV file not found: {csv_path}"}), 404
+        
+        db_path = f'data/{dataset_name}.db'
+        count, factories = load_into_sqlite(db_path, iter_normalized(spec, csv_path))
         
         return jsonify({
             "status": "success",
-            "message": f"Dataset '{dataset_name}' loaded successfully into database",
+            "message": f"Dataset '{dataset_name}' transformed and loaded into database",
             "dataset_name": dataset_name,
             "database_path": db_path,
             "records_loaded": count,
             "factories_count": factories,
-            "tables_created": ["factory_data", "monthly_values"]
+            "tables_created": ["factories", "factory_values", "factory_data", "monthly_values"]
         })
         
     except Exception as e:
-        logger.error(f"Error loading dataset: {str(e)}")
-        return jsonify({"error": f"Error loading dataset: {str(e)}"}), 500
+        logger.error(f"Error transforming and loading dataset: {str(e)}")
+        return jsonify({"error": f"Error transforming and loading dataset: {str(e)}"}), 500
 
 @app.route('/health', methods=['GET'])
 def health():
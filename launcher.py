@@ -2,19 +2,21 @@
 """
 Dual Server Launcher for CSV Data Analysis
 
-Launches two separate servers in different threads:
+Launches two separate servers in their own processes:
 1. MCP Server (server.py) - For query, list, and delete operations
-2. HTTP Server (http.py) - For file operations (analyze, transform, load)
+2. HTTP Server (http_server.py) - For file operations (analyze, transform, load), served by gunicorn
 
-Both servers run completely isolated with different ports.
+Both servers run completely isolated with different ports, and neither
+competes with the other for the GIL.
 """
 
 import os
 import sys
-import threading
+import multiprocessing
 import logging
 import time
 import signal
+import subprocess
 from pathlib import Path
 
 # Set up logging
@@ -25,9 +27,9 @@ logging.basicConfig(
 logger = logging.getLogger("dual-server-launcher")
 
 def run_mcp_server():
-    """Run the MCP server in a separate thread"""
+    """Run the MCP server (target of the MCP child process)"""
     try:
-        logger.info("Starting MCP Server thread...")
+        logger.info("Starting MCP Server process...")
         
         # Import and run MCP server
         import server
@@ -52,40 +54,68 @@ def run_mcp_server():
         logger.error(f"MCP Server error: {e}")
         sys.exit(1)
 
-def run_http_server():
-    """Run the HTTP server in a separate thread"""
+# Server child processes, terminated on shutdown
+mcp_process = None
+http_process = None
+
+def default_http_workers():
+    """Worker count when HTTP_WORKERS is unset: the usable cores, capped at 4"""
+    # cpu_count() reports the whole node inside a container without CPU limits,
+    # so prefer the affinity mask and cap it; each worker is a full Flask process
     try:
-        logger.info("Starting HTTP Server thread...")
-        
-        # Import and configure HTTP server
-        import http_server
-        
-        # Configure HTTP server environment  
-        host = os.getenv("HTTP_HOST", "0.0.0.0")
-        port = int(os.getenv("HTTP_PORT", "8001"))
-        
-        logger.info(f"HTTP Server starting on http://{host}:{port}")
-        
-        # Run the HTTP server
-        http_server.app.run(host=host, port=port, debug=False, threaded=True)
-        
-    except Exception as e:
-        logger.error(f"HTTP Server error: {e}")
-        sys.exit(1)
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return min(cores, 4)
+
+def start_http_server():
+    """Start the HTTP server under gunicorn in a child process"""
+    # Configure HTTP server environment  
+    host = os.getenv("HTTP_HOST", "0.0.0.0")
+    port = int(os.getenv("HTTP_PORT", "8001"))
+    workers = int(os.getenv("HTTP_WORKERS", str(default_http_workers())))
+    threads = int(os.getenv("HTTP_THREADS", "4"))
+    
+    logger.info(f"HTTP Server starting on http://{host}:{port} "
+                f"({workers} workers x {threads} threads)")
+    
+    # Run the HTTP server through gunicorn so CSV processing can use every core
+    return subprocess.Popen([
+        sys.executable, "-m", "gunicorn",
+        "--workers", str(workers),
+        "--worker-class", "gthread",
+        "--threads", str(threads),
+        "--bind", f"{host}:{port}",
+        "http_server:app"
+    ])
+
+def stop_servers(timeout=10):
+    """Terminate both server processes and wait for them to exit"""
+    if http_process is not None and http_process.poll() is None:
+        http_process.terminate()
+    if mcp_process is not None and mcp_process.is_alive():
+        mcp_process.terminate()
+    
+    if http_process is not None:
+        try:
+            http_process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            http_process.kill()
+    if mcp_process is not None:
+        mcp_process.join(timeout=timeout)
+        if mcp_process.is_alive():
+            mcp_process.kill()
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
     logger.info(f"Received signal {signum}, shutting down servers...")
+    stop_servers()
     sys.exit(0)
 
 def main():
     """Main launcher function"""
     logger.info("=== CSV Data Analysis Dual Server Launcher ===")
     
-    # Register signal handlers for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
     # Create data directory if it doesn't exist
     os.makedirs('data', exist_ok=True)
     
@@ -102,23 +132,26 @@ def main():
     logger.info(f"  HTTP Server: http://{http_host}:{http_port}")
     logger.info("")
     
+    global mcp_process, http_process
     try:
-        # Create and start threads
-        mcp_thread = threading.Thread(target=run_mcp_server, name="MCP-Server", daemon=False)
-        http_thread = threading.Thread(target=run_http_server, name="HTTP-Server", daemon=False)
-        
         # Start both servers
         logger.info("Starting both servers...")
-        mcp_thread.start()
+        mcp_process = multiprocessing.Process(target=run_mcp_server, name="MCP-Server")
+        mcp_process.start()
         time.sleep(1)  # Small delay to avoid port conflicts
-        http_thread.start()
+        http_process = start_http_server()
+        
+        # Register signal handlers for graceful shutdown once the children
+        # are running, so they keep the default handlers
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
         
         logger.info("Both servers started successfully!")
         logger.info("Press Ctrl+C to shutdown both servers")
         
-        # Wait for threads to complete
-        mcp_thread.join()
-        http_thread.join()
+        # Wait for processes to complete
+        mcp_process.join()
+        http_process.wait()
         
     except KeyboardInterrupt:
         logger.info("Shutdown requested by user")
@@ -6,63 +6,75 @@ Usage: python query_sqlite.py database.db "SELECT query"
 """
 import sqlite3
 import sys
-import re
+from pathlib import Path
 
-def is_safe_query(query):
-    """Check if query is a safe SELECT statement"""
-    # Remove comments and normalize whitespace
-    cleaned = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-    cleaned = re.sub(r'/\*.*?\*/', '', cleaned, flags=re.DOTALL)
-    cleaned = ' '.join(cleaned.split())
-    
-    # Must start with SELECT (case insensitive)
-    if not re.match(r'^\s*SELECT\s', cleaned, re.IGNORECASE):
-        return False
-    
-    # Check for dangerous statements (case insensitive)
-    dangerous = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'PRAGMA']
-    for keyword in dangerous:
-        if re.search(rf'\b{keyword}\b', cleaned, re.IGNORECASE):
-            return False
-    
-    return True
+# Actions a query may perform; everything else is denied while the statement is prepared
+_READ_ONLY_ACTIONS = frozenset((
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+))
+
+def read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    """sqlite3 authorizer that only lets SELECT statements (and schema lookups) through"""
+    if action in _READ_ONLY_ACTIONS:
+        return sqlite3.SQLITE_OK
+    # table_info is needed for the schema listing and cannot modify anything
+    if action == sqlite3.SQLITE_PRAGMA and arg1 == 'table_info':
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+def connect_read_only(db_path):
+    """Open a database read-only, tuned for reads"""
+    # Opening read-only fails for a missing file instead of creating it; as_uri()
+    # escapes characters such as '#' and '?' that would otherwise end the path
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    # Memory-map the file so large scans read pages without a syscall each
+    for pragma in ("query_only=1", "mmap_size=268435456", "cache_size=-65536"):
+        conn.execute(f"PRAGMA {pragma}")
+    # The first use of the pragma_table_info function registers it in the
+    # schema, which the authorizer would refuse, so do that up front
+    conn.execute("SELECT 1 FROM pragma_table_info('sqlite_master') LIMIT 0")
+    return conn
 
 def query_sqlite(db_path, query):
     """Execute SELECT query and print results"""
-    
-    # Safety check
-    if not is_safe_query(query):
-        print("Error: Only SELECT statements are allowed", file=sys.stderr)
-        sys.exit(1)
-    
     try:
-        conn = sqlite3.connect(db_path)
+        # Read-only connection; the authorizer rejects anything but reads
+        try:
+            conn = connect_read_only(db_path)
+        except sqlite3.OperationalError:
+            print(f"Error: Database not found: {db_path}", file=sys.stderr)
+            sys.exit(1)
+        conn.set_authorizer(read_only_authorizer)
         cursor = conn.cursor()
         
         # Execute query
         cursor.execute(query)
-        results = cursor.fetchall()
         
         # Get column names
         column_names = [description[0] for description in cursor.description]
         
-        # Print results
-        if results:
+        # Print results batch by batch rather than materializing every row
+        cursor.arraysize = 2048
+        batch = cursor.fetchmany()
+        if batch:
             # Print header
-            print('\t'.join(column_names))
-            print('-' * (len('\t'.join(column_names))))
+            header = '\t'.join(column_names)
+            print(header)
+            print('-' * len(header))
             
             # Print data rows
-            for row in results:
-                formatted_row = []
-                for value in row:
-                    if value is None:
-                        formatted_row.append('NULL')
-                    else:
-                        formatted_row.append(str(value))
-                print('\t'.join(formatted_row))
+            row_count = 0
+            while batch:
+                sys.stdout.write('\n'.join('\t'.join('NULL' if value is None else str(value) for value in row)
+                                            for row in batch))
+                sys.stdout.write('\n')
+                row_count += len(batch)
+                batch = cursor.fetchmany()
             
-            print(f"\n{len(results)} row(s) returned")
+            print(f"\n{row_count} row(s) returned")
         else:
             print("No results found")
         
@@ -77,33 +89,42 @@ def query_sqlite(db_path, query):
 
 def show_schema(db_path):
     """Show database schema"""
-    conn = sqlite3.connect(db_path)
+    try:
+        conn = connect_read_only(db_path)
+    except sqlite3.OperationalError:
+        print(f"Error: Database not found: {db_path}", file=sys.stderr)
+        sys.exit(1)
     cursor = conn.cursor()
     
     print("Database Schema:")
     print("================")
     
-    # Get tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
+    # Get every column of every table and view in one query
+    cursor.execute('''
+        SELECT m.name, m.type, p.name, p.type, p."notnull", p.dflt_value, p.pk
+        FROM sqlite_master m
+        JOIN pragma_table_info(m.name) p
+        WHERE m.type IN ('table', 'view')
+        ORDER BY m.rowid, p.cid
+    ''')
     
-    for table_name, in tables:
-        print(f"\nTable: {table_name}")
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
+    current_table = None
+    for table_name, table_type, col_name, col_type, not_null, default, pk in cursor:
+        if table_name != current_table:
+            current_table = table_name
+            kind = "View" if table_type == 'view' else "Table"
+            print(f"\n{kind}: {table_name}")
         
-        for col in columns:
-            col_name, col_type, not_null, default, pk = col[1], col[2], col[3], col[4], col[5]
-            constraints = []
-            if pk:
-                constraints.append("PRIMARY KEY")
-            if not_null:
-                constraints.append("NOT NULL")
-            if default:
-                constraints.append(f"DEFAULT {default}")
-            
-            constraint_str = " " + ", ".join(constraints) if constraints else ""
-            print(f"  {col_name}: {col_type}{constraint_str}")
+        constraints = []
+        if pk:
+            constraints.append("PRIMARY KEY")
+        if not_null:
+            constraints.append("NOT NULL")
+        if default:
+            constraints.append(f"DEFAULT {default}")
+        
+        constraint_str = " " + ", ".join(constraints) if constraints else ""
+        print(f"  {col_name}: {col_type}{constraint_str}")
     
     conn.close()
 
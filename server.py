@@ -8,12 +8,16 @@ Exposes three MCP tools:
 3. delete_dataset - Delete all files associated with a dataset
 """
 
+import io
 import json
 import logging
 import sqlite3
 import re
 import os
-from typing import Optional
+import atexit
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
 
 from fastmcp import FastMCP
 
@@ -24,21 +28,93 @@ logger = logging.getLogger("csv-analysis-server")
 # Initialize FastMCP server
 mcp = FastMCP("CSV Analysis Query Server 📊")
 
-def is_safe_query(query: str) -> bool:
-    """Check if query is a safe SELECT statement"""
-    cleaned = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-    cleaned = re.sub(r'/\*.*?\*/', '', cleaned, flags=re.DOTALL)
-    cleaned = ' '.join(cleaned.split())
-    
-    if not re.match(r'^\s*SELECT\s', cleaned, re.IGNORECASE):
-        return False
-    
-    dangerous = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'PRAGMA']
-    for keyword in dangerous:
-        if re.search(rf'\b{keyword}\b', cleaned, re.IGNORECASE):
-            return False
-    
-    return True
+# Dataset name normalization patterns, compiled once at import
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9_]')
+_MULTI_UNDERSCORE = re.compile(r'_+')
+
+@lru_cache(maxsize=1024)
+def _to_snake(name: str) -> str:
+    """Convert a dataset name to snake_case (cached, callers repeat the same names)"""
+    name = _NON_ALNUM.sub('_', name.lower())
+    return _MULTI_UNDERSCORE.sub('_', name).strip('_')
+
+# Actions a query may perform; everything else is denied while the statement is prepared
+_READ_ONLY_ACTIONS = frozenset((
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+))
+
+def read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    """sqlite3 authorizer that only lets SELECT statements (and schema lookups) through"""
+    if action in _READ_ONLY_ACTIONS:
+        return sqlite3.SQLITE_OK
+    # table_info is needed for the schema listing and cannot modify anything
+    if action == sqlite3.SQLITE_PRAGMA and arg1 == 'table_info':
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+# Largest result query_dataset renders; bigger results fail early (0 disables the cap)
+MAX_QUERY_ROWS = int(os.getenv("MAX_QUERY_ROWS", "10000"))
+
+# Dataset status by which files exist, as a bitmask of
+# spec (8) | raw CSV (4) | normalized CSV (2) | database (1).
+# The normalized CSV is optional once loaded (/transform-and-load skips it)
+_DATASET_STATUS = {
+    0b1111: "Ready for querying",
+    0b1101: "Ready for querying",
+    0b1110: "Ready for database load",
+    0b1100: "Ready for transformation",
+    0b1000: "Analyzed (missing raw CSV)",
+    0b1001: "Analyzed (missing raw CSV)",
+    0b1010: "Analyzed (missing raw CSV)",
+    0b1011: "Analyzed (missing raw CSV)",
+}
+
+# Read-only connections kept open per dataset so repeated queries skip the
+# file opens and keep SQLite's page cache warm
+_CONN_POOL: Dict[str, sqlite3.Connection] = {}
+_POOL_LOCK = threading.Lock()
+
+def _get_ro_conn(dataset_name: str) -> sqlite3.Connection:
+    """Return the pooled read-only connection for a dataset, opening it on first use"""
+    with _POOL_LOCK:
+        conn = _CONN_POOL.get(dataset_name)
+        if conn is None:
+            # Opening read-only fails for a missing file, so this doubles as the existence check
+            try:
+                conn = sqlite3.connect(f'file:data/{dataset_name}.db?mode=ro', uri=True,
+                                       check_same_thread=False)
+            except sqlite3.OperationalError:
+                raise FileNotFoundError(f"Database for dataset '{dataset_name}' not found. Run load_sqlite first.")
+            # journal_mode is already WAL (set by the loader) and cannot be
+            # changed on a read-only connection
+            for pragma in ("query_only=1", "temp_store=MEMORY",
+                           "cache_size=-64000", "mmap_size=268435456"):
+                conn.execute(f"PRAGMA {pragma}")
+            # The first use of the pragma_table_info function registers it in the
+            # schema, which the authorizer would refuse, so do that up front
+            conn.execute("SELECT 1 FROM pragma_table_info('sqlite_master') LIMIT 0")
+            conn.set_authorizer(read_only_authorizer)
+            _CONN_POOL[dataset_name] = conn
+        return conn
+
+def _close_ro_conn(dataset_name: str) -> None:
+    """Close and forget the pooled connection for a dataset, if any"""
+    with _POOL_LOCK:
+        conn = _CONN_POOL.pop(dataset_name, None)
+    if conn is not None:
+        conn.close()
+
+@atexit.register
+def _close_all_ro_conns() -> None:
+    """Close every pooled connection on shutdown"""
+    with _POOL_LOCK:
+        conns = list(_CONN_POOL.values())
+        _CONN_POOL.clear()
+    for conn in conns:
+        conn.close()
 
 
 @mcp.tool
@@ -56,67 +132,73 @@ def query_dataset(dataset_name: str, query: str = "", show_schema: bool = False)
     """
     try:
         # Convert dataset name to snake_case
-        dataset_name = re.sub(r'[^a-zA-Z0-9_]', '_', dataset_name.lower())
-        dataset_name = re.sub(r'_+', '_', dataset_name).strip('_')
+        dataset_name = _to_snake(dataset_name)
         
-        db_path = f'data/{dataset_name}.db'
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database for dataset '{dataset_name}' not found. Run load_sqlite first.")
-            
-        conn = sqlite3.connect(db_path)
+        # Pooled read-only connection; the authorizer rejects anything but reads
+        conn = _get_ro_conn(dataset_name)
         cursor = conn.cursor()
         
         if show_schema or not query:
-            # Show schema
-            result_text = f"Database Schema for dataset '{dataset_name}':\n" + "="*50 + "\n"
+            # Show schema, collected in a list and joined once
+            parts = [f"Database Schema for dataset '{dataset_name}':\n", "="*50 + "\n"]
             
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
+            # Every column of every table and view in one query
+            cursor.execute('''
+                SELECT m.name, m.type, p.name, p.type, p."notnull", p.dflt_value, p.pk
+                FROM sqlite_master m
+                JOIN pragma_table_info(m.name) p
+                WHERE m.type IN ('table', 'view')
+                ORDER BY m.rowid, p.cid
+            ''')
             
-            for table_name, in tables:
-                result_text += f"\nTable: {table_name}\n"
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
+            current_table = None
+            for table_name, table_type, col_name, col_type, not_null, default, pk in cursor:
+                if table_name != current_table:
+                    current_table = table_name
+                    kind = "View" if table_type == 'view' else "Table"
+                    parts.append(f"\n{kind}: {table_name}\n")
+                
+                constraints = []
+                if pk:
+                    constraints.append("PRIMARY KEY")
+                if not_null:
+                    constraints.append("NOT NULL") 
+                if default:
+                    constraints.append(f"DEFAULT {default}")
                 
-                for col in columns:
-                    col_name, col_type, not_null, default, pk = col[1], col[2], col[3], col[4], col[5]
-                    constraints = []
-                    if pk:
-                        constraints.append("PRIMARY KEY")
-                    if not_null:
-                        constraints.append("NOT NULL") 
-                    if default:
-                        constraints.append(f"DEFAULT {default}")
-                    
-                    constraint_str = " " + ", ".join(constraints) if constraints else ""
-                    result_text += f"  {col_name}: {col_type}{constraint_str}\n"
+                constraint_str = " " + ", ".join(constraints) if constraints else ""
+                parts.append(f"  {col_name}: {col_type}{constraint_str}\n")
+            
+            result_text = ''.join(parts)
         else:
             # Execute query
-            if not is_safe_query(query):
-                raise ValueError("Only SELECT statements are allowed")
-            
             cursor.execute(query)
-            results = cursor.fetchall()
             column_names = [description[0] for description in cursor.description]
             
-            if results:
-                result_text = '\t'.join(column_names) + '\n'
-                result_text += '-' * len('\t'.join(column_names)) + '\n'
+            # Render rows batch by batch into one buffer instead of growing a string per row
+            cursor.arraysize = 2048
+            batch = cursor.fetchmany()
+            if batch:
+                header = '\t'.join(column_names)
+                buf = io.StringIO()
+                buf.write(header + '\n' + '-' * len(header) + '\n')
+                row_count = 0
+                while batch:
+                    row_count += len(batch)
+                    if MAX_QUERY_ROWS and row_count > MAX_QUERY_ROWS:
+                        cursor.close()
+                        raise ValueError(f"Query returned more than {MAX_QUERY_ROWS} rows. "
+                                         "Add a LIMIT or aggregate the data.")
+                    buf.write('\n'.join('\t'.join('NULL' if value is None else str(value) for value in row)
+                                        for row in batch))
+                    buf.write('\n')
+                    batch = cursor.fetchmany()
                 
-                for row in results:
-                    formatted_row = []
-                    for value in row:
-                        if value is None:
-                            formatted_row.append('NULL')
-                        else:
-                            formatted_row.append(str(value))
-                    result_text += '\t'.join(formatted_row) + '\n'
-                
-                result_text += f"\n{len(results)} row(s) returned"
+                buf.write(f"\n{row_count} row(s) returned")
+                result_text = buf.getvalue()
             else:
                 result_text = "No results found"
         
-        conn.close()
         return result_text
         
     except Exception as e:
@@ -134,9 +216,14 @@ def list_datasets() -> str:
         # Create data directory if it doesn't exist
         os.makedirs('data', exist_ok=True)
         
+        # One directory scan answers every existence check below
+        with os.scandir('data') as it:
+            filenames = [entry.name for entry in it if entry.is_file()]
+        existing = set(filenames)
+        
         # Find all spec files to identify datasets
         datasets = {}
-        for filename in os.listdir('data'):
+        for filename in filenames:
             if filename.endswith('_spec.json'):
                 dataset_name = filename.replace('_spec.json', '')
                 datasets[dataset_name] = {
@@ -149,37 +236,30 @@ def list_datasets() -> str:
         if not datasets:
             return "No datasets found. Use analyze_csv to create a dataset."
         
-        result = "Available Datasets:\n" + "="*50 + "\n"
+        # Output is collected in a list and joined once
+        parts = ["Available Datasets:\n", "="*50 + "\n"]
         
         for name, files in datasets.items():
-            result += f"\nDataset: {name}\n"
+            parts.append(f"\nDataset: {name}\n")
             
-            # Check file existence
-            spec_exists = os.path.exists(files['spec'])
-            raw_exists = os.path.exists(files['raw_csv'])
-            normalized_exists = os.path.exists(files['normalized_csv'])
-            db_exists = os.path.exists(files['database'])
+            # Check file existence against the directory listing
+            spec_exists = f'{name}_spec.json' in existing
+            raw_exists = f'{name}_raw.csv' in existing
+            normalized_exists = f'{name}_normalized.csv' in existing
+            db_exists = f'{name}.db' in existing
             
-            result += f"  ✓ Spec file: {files['spec']}\n" if spec_exists else f"  ✗ Spec file: {files['spec']}\n"
-            result += f"  ✓ Raw CSV: {files['raw_csv']}\n" if raw_exists else f"  ✗ Raw CSV: {files['raw_csv']}\n"
-            result += f"  ✓ Normalized CSV: {files['normalized_csv']}\n" if normalized_exists else f"  ✗ Normalized CSV: {files['normalized_csv']}\n"
-            result += f"  ✓ Database: {files['database']}\n" if db_exists else f"  ✗ Database: {files['database']}\n"
+            parts.append(f"  ✓ Spec file: {files['spec']}\n" if spec_exists else f"  ✗ Spec file: {files['spec']}\n")
+            parts.append(f"  ✓ Raw CSV: {files['raw_csv']}\n" if raw_exists else f"  ✗ Raw CSV: {files['raw_csv']}\n")
+            parts.append(f"  ✓ Normalized CSV: {files['normalized_csv']}\n" if normalized_exists else f"  ✗ Normalized CSV: {files['normalized_csv']}\n")
+            parts.append(f"  ✓ Database: {files['database']}\n" if db_exists else f"  ✗ Database: {files['database']}\n")
             
             # Show status
-            if spec_exists and raw_exists and normalized_exists and db_exists:
-                status = "Ready for querying"
-            elif spec_exists and raw_exists and normalized_exists:
-                status = "Ready for database load"
-            elif spec_exists and raw_exists:
-                status = "Ready for transformation"
-            elif spec_exists:
-                status = "Analyzed (missing raw CSV)"
-            else:
-                status = "Incomplete"
+            mask = (spec_exists << 3) | (raw_exists << 2) | (normalized_exists << 1) | db_exists
+            status = _DATASET_STATUS.get(mask, "Incomplete")
             
-            result += f"  Status: {status}\n"
+            parts.append(f"  Status: {status}\n")
         
-        return result
+        return ''.join(parts)
         
     except Exception as e:
         raise Exception(f"Error listing datasets: {str(e)}")
@@ -197,8 +277,10 @@ def delete_dataset(dataset_name: str) -> str:
     """
     try:
         # Convert dataset name to snake_case
-        dataset_name = re.sub(r'[^a-zA-Z0-9_]', '_', dataset_name.lower())
-        dataset_name = re.sub(r'_+', '_', dataset_name).strip('_')
+        dataset_name = _to_snake(dataset_name)
+        
+        # Release the pooled connection before its files go away
+        _close_ro_conn(dataset_name)
         
         # Define all possible files for the dataset
         files_to_delete = [
@@ -211,13 +293,23 @@ def delete_dataset(dataset_name: str) -> str:
         deleted_files = []
         missing_files = []
         
+        # Remove directly; a missing file costs one failed unlink instead of stat + unlink
         for file_path in files_to_delete:
-            if os.path.exists(file_path):
+            try:
                 os.remove(file_path)
                 deleted_files.append(file_path)
-            else:
+            except FileNotFoundError:
                 missing_files.append(file_path)
-        
+
+        # WAL side files stay behind after read-only connections close
+        for suffix in ('-wal', '-shm'):
+            side_file = f'data/{dataset_name}.db{suffix}'
+            try:
+                os.remove(side_file)
+                deleted_files.append(side_file)
+            except FileNotFoundError:
+                pass
+
         if not deleted_files and not missing_files:
             return f"Dataset '{dataset_name}' not found."
         
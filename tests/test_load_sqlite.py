@@ -0,0 +1,230 @@
+"""
+Tests for the streaming JSON reader in load_sqlite.py
+
+Run from the repository root: python -m unittest discover tests
+"""
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from load_sqlite import iter_json_array, load_sqlite
+
+try:
+    from http_server import load_into_sqlite
+except ImportError:  # flask not installed
+    load_into_sqlite = None
+
+RECORDS = [
+    {"factory": "Werk A", "year": 2024, "month": month, "ytd_value": month * 1000.5}
+    for month in range(1, 13)
+] + [
+    {"factory": "Werk \"B\", [Süd]", "year": 2025, "month": 1, "ytd_value": None},
+]
+
+def compact(records):
+    """Layout written by transform_csv.py --json"""
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    return '[' + ''.join((',\n' if i else '\n') + encode(r) for i, r in enumerate(records)) + ('\n]' if records else ']')
+
+def pretty(records):
+    """Layout written by transform_csv.py --json --pretty"""
+    return json.dumps(records, indent=2)
+
+class IterJsonArrayTest(unittest.TestCase):
+    def read(self, text, **kwargs):
+        return list(iter_json_array(io.StringIO(text), **kwargs))
+
+    def test_layouts(self):
+        self.assertEqual(self.read(compact(RECORDS)), RECORDS)
+        self.assertEqual(self.read(pretty(RECORDS)), RECORDS)
+
+    def test_empty_array(self):
+        for text in ('[]', compact([]), pretty([]), '  [\n\n]\n'):
+            self.assertEqual(self.read(text), [])
+
+    def test_records_split_across_chunks(self):
+        for layout in (compact, pretty):
+            text = layout(RECORDS)
+            for chunk_size in (1, 2, 3, 7, 64):
+                self.assertEqual(self.read(text, chunk_size=chunk_size), RECORDS,
+                                 f"{layout.__name__} with chunk_size={chunk_size}")
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            self.read('{"factory": "Werk A"}')
+
+    def test_unterminated_array(self):
+        with self.assertRaises(ValueError):
+            self.read(compact(RECORDS)[:-1])
+
+    def test_separators_are_strict(self):
+        for text in ('[{"a":1}{"b":2},,,{"c":3}]', '[{"a":1}{"b":2}]', '[{"a":1},,{"b":2}]',
+                     '[,{"a":1}]', '[{"a":1},]'):
+            for chunk_size in (1, 64):
+                with self.subTest(text=text, chunk_size=chunk_size), self.assertRaises(ValueError):
+                    self.read(text, chunk_size=chunk_size)
+
+    def test_trailing_data(self):
+        for text in ('[{"a":1}] garbage', '[]]', compact(RECORDS) + '\n[]'):
+            with self.subTest(text=text[-12:]), self.assertRaises(ValueError):
+                self.read(text)
+        self.assertEqual(self.read(compact(RECORDS) + ' \n\t'), RECORDS)
+
+    def test_numbers_split_across_chunks(self):
+        text = '[1, 23456, 7.5e3, -0.25, true, null]'
+        for chunk_size in (1, 2, 3, 5):
+            self.assertEqual(self.read(text, chunk_size=chunk_size), json.loads(text))
+
+    def test_malformed_record(self):
+        text = compact(RECORDS).replace('"year":2024', '"year":2024x', 1)
+        with self.assertRaises(json.JSONDecodeError):
+            self.read(text)
+
+    def test_malformed_record_fails_without_reading_the_rest(self):
+        text = compact([{"factory": "broken"}] + RECORDS * 500).replace('"broken"', '"broken', 1)
+        f = io.StringIO(text)
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(f, chunk_size=64, max_record_size=1024))
+        self.assertLess(f.tell(), 2048)
+
+class LoadJsonTest(unittest.TestCase):
+    def test_load_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'normalized.json')
+            db_path = os.path.join(tmp, 'data.db')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                f.write(compact(RECORDS))
+
+            with redirect_stdout(io.StringIO()):
+                load_sqlite(json_path, db_path, is_json=True)
+
+            conn = sqlite3.connect(db_path)
+            rows = conn.execute('SELECT factory, year, month, ytd_value FROM factory_data').fetchall()
+            conn.close()
+            self.assertEqual(sorted(rows, key=repr),
+                             sorted((tuple(r.values()) for r in RECORDS), key=repr))
+
+    def test_failed_load_releases_write_lock(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'normalized.json')
+            db_path = os.path.join(tmp, 'data.db')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                f.write(compact(RECORDS).replace('"year":2025', '"year":2025x'))
+
+            with redirect_stdout(io.StringIO()), self.assertRaises(json.JSONDecodeError):
+                load_sqlite(json_path, db_path, is_json=True)
+
+            # Another writer gets the lock at once, and nothing of the failed load was kept
+            conn = sqlite3.connect(db_path, timeout=0, isolation_level=None)
+            conn.execute('BEGIN IMMEDIATE')
+            tables = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            conn.execute('ROLLBACK')
+            conn.close()
+            self.assertEqual(tables, [])
+
+# Schema written by the original load_sqlite.py, before factory names were
+# dictionary-encoded and monthly_values became a view
+BASELINE_SCHEMA = '''
+    CREATE TABLE factory_data (
+        factory TEXT NOT NULL,
+        year INTEGER,
+        month INTEGER,
+        ytd_value REAL,
+        PRIMARY KEY (factory, year, month)
+    );
+    CREATE INDEX idx_factory ON factory_data(factory);
+    CREATE INDEX idx_year_month ON factory_data(year, month);
+'''
+BASELINE_MONTHLY_VALUES = '''
+    SELECT
+        f1.factory,
+        f1.year,
+        f1.month,
+        f1.ytd_value,
+        CASE
+            WHEN f1.month = 1 THEN f1.ytd_value
+            ELSE f1.ytd_value - COALESCE(f2.ytd_value, 0)
+        END as month_value
+    FROM factory_data f1
+    LEFT JOIN factory_data f2 ON
+        f1.factory = f2.factory AND
+        f1.year = f2.year AND
+        f1.month = f2.month + 1
+    ORDER BY f1.factory, f1.year, f1.month
+'''
+
+# Werk A skips month 3, so month 4 has no previous month to subtract
+LEGACY_ROWS = [
+    ('Werk A', 2024, 1, 100.0), ('Werk A', 2024, 2, 250.0), ('Werk A', 2024, 4, 600.0),
+    ('Werk A', 2025, 1, 80.0), ('Werk B', 2024, 1, None), ('Werk B', 2024, 2, 40.0),
+]
+# Replaces one legacy row and adds a factory
+NEW_ROWS = [('Werk A', 2024, 2, 300.0), ('Werk C', 2024, 1, 10.0), ('Werk C', 2024, 2, 25.5)]
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'data.db')
+
+        # A database as the original loader left it, monthly_values included
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany('INSERT INTO factory_data VALUES (?, ?, ?, ?)', LEGACY_ROWS)
+        conn.execute('CREATE TABLE monthly_values AS ' + BASELINE_MONTHLY_VALUES)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def expected(self):
+        """factory_data and monthly_values as the original schema would give them after the load"""
+        rows = {row[:3]: row for row in LEGACY_ROWS}
+        rows.update((row[:3], row) for row in NEW_ROWS)
+        conn = sqlite3.connect(':memory:')
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany('INSERT INTO factory_data VALUES (?, ?, ?, ?)', rows.values())
+        factory_data = conn.execute('SELECT * FROM factory_data ORDER BY factory, year, month').fetchall()
+        monthly_values = conn.execute(BASELINE_MONTHLY_VALUES).fetchall()
+        conn.close()
+        return factory_data, monthly_values
+
+    def check_migrated(self):
+        conn = sqlite3.connect(self.db_path)
+        objects = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+        factory_data = conn.execute('SELECT * FROM factory_data ORDER BY factory, year, month').fetchall()
+        monthly_values = conn.execute(
+            'SELECT * FROM monthly_values ORDER BY factory, year, month').fetchall()
+        conn.close()
+
+        self.assertEqual(objects, {
+            'factories': 'table',
+            'factory_values': 'table',
+            'factory_data': 'view',
+            'monthly_values': 'view',
+            'idx_year_month': 'index',
+        })
+        self.assertEqual((factory_data, monthly_values), self.expected())
+
+    def test_load_sqlite_migrates_baseline_database(self):
+        csv_path = os.path.join(self.tmp.name, 'normalized.csv')
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('factory,year,month,ytd_value\n')
+            f.writelines(f'{factory},{year},{month},{value}\n' for factory, year, month, value in NEW_ROWS)
+
+        with redirect_stdout(io.StringIO()):
+            load_sqlite(csv_path, self.db_path)
+        self.check_migrated()
+
+    @unittest.skipIf(load_into_sqlite is None, "flask is not installed")
+    def test_load_into_sqlite_migrates_baseline_database(self):
+        count, factories = load_into_sqlite(self.db_path, NEW_ROWS)
+        self.assertEqual((count, factories), (len(LEGACY_ROWS) + 2, 3))
+        self.check_migrated()
+
+if __name__ == '__main__':
+    unittest.main()
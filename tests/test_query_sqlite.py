@@ -0,0 +1,150 @@
+"""
+Tests for the read-only query path: the SQLite authorizer in query_sqlite.py
+and server.py, and the read-only connection
+
+Run from the repository root: python -m unittest discover tests
+"""
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+from load_sqlite import load_sqlite
+from query_sqlite import connect_read_only, query_sqlite, read_only_authorizer, show_schema
+
+try:
+    import server
+except ImportError:  # fastmcp not installed
+    server = None
+
+DENIED = [
+    "DELETE FROM factory_values",
+    "UPDATE factories SET name = 'x'",
+    "INSERT INTO factories (name) VALUES ('x')",
+    "DROP VIEW monthly_values",
+    "ATTACH DATABASE ':memory:' AS other",
+    "PRAGMA journal_mode=DELETE",
+    "CREATE TEMP TABLE scratch (x)",
+    "BEGIN",
+]
+
+ALLOWED = [
+    "SELECT COUNT(*) FROM factory_data",
+    "SELECT factory, SUM(month_value) FROM monthly_values GROUP BY factory",
+    "WITH totals AS (SELECT factory, MAX(ytd_value) AS total FROM factory_data GROUP BY factory) "
+    "SELECT * FROM totals",
+    "SELECT replace(factory, 'Werk', 'Plant') FROM factory_data",
+    "SELECT name FROM pragma_table_info('factory_values')",
+]
+
+def build_database(directory, name='data.db'):
+    """Load a small normalized CSV into a new database and return its path"""
+    csv_path = os.path.join(directory, 'normalized.csv')
+    db_path = os.path.join(directory, name)
+    with open(csv_path, 'w', encoding='utf-8') as f:
+        f.write('factory,year,month,ytd_value\n')
+        for factory in ('Werk A', 'Werk B'):
+            for month in range(1, 4):
+                f.write(f'{factory},2024,{month},{month * 100.0}\n')
+    with redirect_stdout(io.StringIO()):
+        load_sqlite(csv_path, db_path)
+    return db_path
+
+class ReadOnlyAuthorizerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = build_database(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def count_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute('SELECT COUNT(*) FROM factory_values').fetchone()[0]
+        conn.close()
+        return count
+
+    def test_authorizer_alone_rejects_writes(self):
+        # A writable connection, so nothing but the authorizer stands in the way
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.set_authorizer(read_only_authorizer)
+        for query in DENIED:
+            with self.subTest(query=query), self.assertRaises(sqlite3.DatabaseError):
+                conn.execute(query)
+        conn.close()
+        self.assertEqual(self.count_rows(), 6)
+
+    def test_allowed_queries(self):
+        conn = connect_read_only(self.db_path)
+        conn.set_authorizer(read_only_authorizer)
+        for query in ALLOWED:
+            with self.subTest(query=query):
+                self.assertTrue(conn.execute(query).fetchall())
+        conn.close()
+
+    def test_query_sqlite_rejects_writes(self):
+        for query in DENIED:
+            with self.subTest(query=query), redirect_stderr(io.StringIO()) as err, \
+                    self.assertRaises(SystemExit):
+                query_sqlite(self.db_path, query)
+            self.assertIn('not authorized', err.getvalue())
+        self.assertEqual(self.count_rows(), 6)
+
+    def test_show_schema(self):
+        with redirect_stdout(io.StringIO()) as out:
+            show_schema(self.db_path)
+        text = out.getvalue()
+        self.assertIn('Table: factory_values', text)
+        self.assertIn('View: monthly_values', text)
+        self.assertIn('month_value', text)
+
+    def test_path_with_uri_characters(self):
+        directory = os.path.join(self.tmp.name, 'we#ird?dir')
+        os.mkdir(directory)
+        db_path = build_database(directory, 'x.db')
+        conn = connect_read_only(db_path)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM factory_data').fetchone()[0], 6)
+        conn.close()
+
+    def test_missing_database_is_not_created(self):
+        db_path = os.path.join(self.tmp.name, 'missing.db')
+        with self.assertRaises(sqlite3.OperationalError):
+            connect_read_only(db_path)
+        self.assertFalse(os.path.exists(db_path))
+
+@unittest.skipIf(server is None, "fastmcp is not installed")
+class QueryDatasetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.mkdir('data')
+        build_database('data', 'plants.db')
+        # Registered tools are wrapped by FastMCP; call the plain function
+        self.query_dataset = getattr(server.query_dataset, 'fn', server.query_dataset)
+
+    def tearDown(self):
+        server._close_all_ro_conns()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_rejects_writes(self):
+        for query in DENIED:
+            with self.subTest(query=query), self.assertRaisesRegex(Exception, 'not authorized'):
+                self.query_dataset('plants', query)
+        self.assertIn('6 row(s) returned', self.query_dataset('plants', 'SELECT * FROM factory_values'))
+
+    def test_allowed_queries(self):
+        for query in ALLOWED:
+            with self.subTest(query=query):
+                self.assertIn('row(s) returned', self.query_dataset('plants', query))
+
+    def test_schema_listing(self):
+        text = self.query_dataset('plants', show_schema=True)
+        self.assertIn('Table: factory_values', text)
+        self.assertIn('View: monthly_values', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,76 +2,169 @@
 """
 transform_csv.py - Transform wide format CSV to normalized long format
 
-Usage: python transform_csv.py input.csv transform_spec.json output.csv [--json]
+Usage: python transform_csv.py input.csv transform_spec.json output.csv [--json [--pretty]] [--workers N]
 """
 import csv
+import io
 import json
+import mmap
 import sys
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 
 def parse_european_number(value_str):
     """Convert European number format (1.126.286) to float"""
-    if not value_str or value_str.strip() == '':
+    if not value_str:
         return None
     
-    # Remove thousand separators (periods) and convert to float
-    cleaned = value_str.strip().replace('.', '')
+    # Remove thousand separators (periods) and convert to float;
+    # float() ignores surrounding whitespace and rejects blank strings itself
     try:
-        return float(cleaned)
+        return float(value_str.replace('.', ''))
     except ValueError:
         return None
 
-def transform_csv(input_path, spec_path, output_path, output_json=False):
+def split_until_quoted(f, delimiter):
+    """Split lines directly until the first quote, then hand the rest to csv.reader"""
+    for line in f:
+        if '"' in line:
+            yield from csv.reader(chain([line], f), delimiter=delimiter)
+            return
+        yield line.rstrip('\r\n').split(delimiter)
+
+def row_reader(f, spec):
+    """Return a row iterator for a CSV file; unquoted lines are split directly"""
+    delimiter = spec['delimiter']
+    quoting = spec.get('quoting')
+    if quoting == 'none':
+        # Without quoted fields a plain split gives the same rows as csv.reader, faster
+        return (line.rstrip('\r\n').split(delimiter) for line in f)
+    if quoting is None:
+        return split_until_quoted(f, delimiter)
+    return csv.reader(f, delimiter=delimiter)
+
+def normalize_rows(reader, spec):
+    """Yield (factory, year, month, ytd_value) records for the data rows of a wide CSV"""
+    # Bind column specs once instead of looking them up per cell
+    factory_idx = spec['factory_column_index']
+    cols = [(c['column_index'], c['year'], c['month']) for c in spec['data_columns']]
+    parse = parse_european_number
+    
+    for row in reader:
+        if not row or not row[0].strip():  # Skip empty rows
+            continue
+            
+        factory = row[factory_idx]
+        
+        # Process each data column
+        row_len = len(row)
+        for col_idx, year, month in cols:
+            if col_idx < row_len:
+                # Sparse sheets leave many cells empty, emit those as NULL without parsing
+                raw_value = row[col_idx]
+                ytd_value = parse(raw_value) if raw_value else None
+                yield (factory, year, month, ytd_value)
+
+def has_quotes(input_path):
+    """Check whether a file contains any double quote"""
+    with open(input_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm.find(b'"') != -1
+
+def split_data_ranges(input_path, chunk_size=1 << 20):
+    """Split the data rows of a CSV into newline-aligned byte ranges of about chunk_size bytes"""
+    with open(input_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        
+        # Data starts after the two header rows
+        start = 0
+        for _ in range(2):
+            newline = mm.find(b'\n', start)
+            start = size if newline == -1 else newline + 1
+        
+        ranges = []
+        while start < size:
+            newline = mm.find(b'\n', min(start + chunk_size, size - 1))
+            end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def normalize_range(input_path, byte_range, spec):
+    """Normalize the data rows within one byte range of a CSV"""
+    start, end = byte_range
+    with open(input_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8')
+    reader = row_reader(io.StringIO(text), spec)
+    return list(normalize_rows(reader, spec))
+
+def read_records(input_path, spec, workers=1):
+    """Yield normalized records from a wide CSV, parsing chunks in parallel when workers > 1"""
+    # Ranges are cut at any newline, which is only a row boundary when no field is quoted
+    quoting = spec.get('quoting')
+    if workers > 1 and quoting is None:
+        quoting = 'minimal' if has_quotes(input_path) else 'none'
+    if workers <= 1 or quoting != 'none':
+        with open(input_path, 'r', encoding='utf-8', newline='') as f:
+            reader = row_reader(f, spec)
+            
+            # Skip header rows
+            next(reader)  # Skip first header row
+            next(reader)  # Skip second header row
+            
+            yield from normalize_rows(reader, spec)
+        return
+    
+    ranges = split_data_ranges(input_path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep only a few ranges in flight so memory stays bounded, and yield
+        # them in submission order so output matches the serial path
+        pending = deque()
+        for byte_range in ranges:
+            pending.append(pool.submit(normalize_range, input_path, byte_range, spec))
+            if len(pending) > workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def transform_csv(input_path, spec_path, output_path, output_json=False, workers=1, pretty=False):
     """Transform wide CSV to normalized format using TransformSpec"""
     
     # Load TransformSpec
     with open(spec_path, 'r', encoding='utf-8') as f:
         spec = json.load(f)
     
-    # Read CSV and transform
-    normalized_data = []
+    fieldnames = ['factory', 'year', 'month', 'ytd_value']
+    records_processed = 0
     
-    with open(input_path, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter=spec['delimiter'])
-        
-        # Skip header rows
-        next(reader)  # Skip first header row
-        next(reader)  # Skip second header row
-        
-        # Process data rows
-        for row in reader:
-            if not row or not row[0].strip():  # Skip empty rows
-                continue
-                
-            factory = row[spec['factory_column_index']]
-            
-            # Process each data column
-            for col_spec in spec['data_columns']:
-                col_idx = col_spec['column_index']
-                if col_idx < len(row):
-                    raw_value = row[col_idx]
-                    ytd_value = parse_european_number(raw_value)
-                    
-                    normalized_data.append({
-                        'factory': factory,
-                        'year': col_spec['year'],
-                        'month': col_spec['month'],
-                        'ytd_value': ytd_value
-                    })
+    # Read CSV and stream transformed records to the output
+    records = read_records(input_path, spec, workers)
     
-    # Write output
-    if output_json:
+    if output_json and pretty:
+        normalized_data = [dict(zip(fieldnames, record)) for record in records]
+        records_processed = len(normalized_data)
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(normalized_data, f, indent=2)
+    elif output_json:
+        # Stream compact records, one per line, without building the full list first
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for record in records:
+                f.write((',\n' if records_processed else '\n') + encode(dict(zip(fieldnames, record))))
+                records_processed += 1
+            f.write('\n]' if records_processed else ']')
     else:
         # Write CSV
         with open(output_path, 'w', encoding='utf-8', newline='') as f:
-            fieldnames = ['factory', 'year', 'month', 'ytd_value']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(normalized_data)
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            for record in records:
+                writer.writerow(record)
+                records_processed += 1
     
-    print(f"Normalized data written to {output_path} ({len(normalized_data)} records)")
+    print(f"Normalized data written to {output_path} ({records_processed} records)")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -79,6 +172,9 @@ if __name__ == "__main__":
     parser.add_argument('transform_spec', help='TransformSpec JSON file')
     parser.add_argument('output', help='Output file')
     parser.add_argument('--json', action='store_true', help='Output as JSON instead of CSV')
+    parser.add_argument('--pretty', action='store_true', help='Indent JSON output (builds it in memory)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse the CSV in parallel across this many processes (large unquoted files)')
     
     args = parser.parse_args()
-    transform_csv(args.input_csv, args.transform_spec, args.output, args.json)
\ No newline at end of file
+    transform_csv(args.input_csv, args.transform_spec, args.output, args.json, args.workers, args.pretty)
\ No newline at end of file